@@ -1,8 +1,45 @@
-import html
-from typing import Any
+from itertools import islice
 
 import streamlit as st
 
+from anemia_core import (
+    APPROPRIATE_RESPONSES,
+    BADGE_TEMPLATE,
+    CONFIDENCE_CLASSES,
+    EXPOSURE_OPTIONS,
+    HEMOLYSIS_TRIAD,
+    INADEQUATE_RESPONSES,
+    LAB_STATUS_RULES,
+    MCV_OPTIONS,
+    MORPHOLOGY_CONFOUNDING_EXPOSURES,
+    NORMAL_HIGH_UNKNOWN_OPTIONS,
+    NORMAL_LOW_UNKNOWN_OPTIONS,
+    RETIC_QUAL_OPTIONS,
+    SELECT_PLACEHOLDER,
+    SEX_OPTIONS,
+    YES_NO_UNKNOWN_OPTIONS,
+    YES_OR_UNKNOWN,
+    Facts,
+    ReferralFacts,
+    build_differential,
+    build_known,
+    build_referral_reasons,
+    clean_evidence,
+    data_completeness,
+    entered_groups,
+    field_style,
+    filter_suggestions,
+    fmt,
+    interpret_iron_pattern,
+    next_most_informative,
+    progressive_tree_dot,
+    recommended_next_steps,
+    reticulocyte_indices,
+    safe_text,
+    selected,
+    to_float,
+)
+
 
 st.set_page_config(
     page_title="AnemiaDx",
@@ -224,122 +261,9 @@ st.markdown(
 # ============================================================
 # HELPERS
 # ============================================================
-def to_float(value: str | None) -> float | None:
-    cleaned = (value or "").strip()
-    if cleaned == "":
-        return None
-    try:
-        return float(cleaned)
-    except ValueError:
-        return None
-
-
-def fmt(value: Any, digits: int = 1, suffix: str = "") -> str:
-    if value is None:
-        return "—"
-    try:
-        return f"{float(value):.{digits}f}{suffix}"
-    except (TypeError, ValueError):
-        return f"{value}{suffix}"
-
-
-def selected(value: str | None) -> str | None:
-    return None if value in (None, "", "Select...", "Select…") else value
-
-
-def known_choice(value: str | None) -> bool:
-    return value not in (None, "Unknown")
-
-
-def safe_text(value: Any) -> str:
-    return html.escape(str(value))
-
-
-def dedupe_lines(lines: list[str]) -> list[str]:
-    seen: set[str] = set()
-    result: list[str] = []
-    for line in lines:
-        cleaned = (line or "").strip()
-        if cleaned and cleaned not in seen:
-            seen.add(cleaned)
-            result.append(cleaned)
-    return result
-
-
-def clean_evidence(values: list[Any]) -> list[str]:
-    """Remove empty or unknown values before rendering support bubbles."""
-    cleaned: list[str] = []
-    for value in values:
-        text = str(value).strip()
-        if not text:
-            continue
-        if "unknown" in text.lower():
-            continue
-        if text in {"None", "—"}:
-            continue
-        cleaned.append(text)
-    return dedupe_lines(cleaned)
-
-
-def add_dx(
-    items: list[dict[str, Any]],
-    title: str,
-    rationale: str,
-    evidence: list[Any] | None = None,
-    workup: list[str] | None = None,
-    confidence: str = "Possible",
-    priority: int = 50,
-) -> None:
-    items.append(
-        {
-            "title": title,
-            "rationale": rationale,
-            "evidence": clean_evidence(evidence or []),
-            "workup": workup or [],
-            "confidence": confidence,
-            "priority": priority,
-        }
-    )
-
-
-def dedupe_dx(items: list[dict[str, Any]]) -> list[dict[str, Any]]:
-    seen: set[str] = set()
-    result: list[dict[str, Any]] = []
-    for item in items:
-        if item["title"] not in seen:
-            seen.add(item["title"])
-            result.append(item)
-    return result
-
-
-def maturation_factor(hct: float | None) -> float | None:
-    if hct is None:
-        return None
-    if hct >= 40:
-        return 1.0
-    if hct >= 30:
-        return 1.5
-    if hct >= 20:
-        return 2.0
-    return 2.5
-
-
-def field_style(label: str, status: str) -> str:
-    palette = {
-        "abnormal": ("#dc2626", "rgba(220, 38, 38, 0.18)"),
-        "borderline": ("#d97706", "rgba(245, 158, 11, 0.18)"),
-        "normal": ("#16a34a", "rgba(34, 197, 94, 0.14)"),
-    }
-    if status not in palette:
-        return ""
-    border, background = palette[status]
-    return (
-        f'input[aria-label="{label}"] {{'
-        f'background: {background} !important;'
-        f'border: 2px solid {border} !important;'
-        f'box-shadow: 0 0 0 1px {border}33 !important;'
-        f'}}'
-    )
+def yn_select(label: str, key: str) -> str | None:
+    """Yes/No/Unknown selectbox that returns None while the placeholder is shown."""
+    return selected(st.selectbox(label, YES_NO_UNKNOWN_OPTIONS, key=key))
 
 
 def inject_input_highlights(
@@ -358,190 +282,19 @@ def inject_input_highlights(
         low_hb = (sex == "Female" and hb < 12) or (sex == "Male" and hb < 13)
         rules.append(field_style("Hemoglobin (g/dL)", "abnormal" if low_hb else "normal"))
 
-    if ferritin is not None:
-        status = "abnormal" if ferritin < 30 else "borderline" if ferritin < 100 else "normal"
-        rules.append(field_style("Ferritin (ng/mL)", status))
-
-    if tsat is not None:
-        rules.append(field_style("Transferrin Saturation (%)", "abnormal" if tsat < 20 else "normal"))
-
-    if b12 is not None:
-        status = "abnormal" if b12 < 200 else "borderline" if b12 < 300 else "normal"
-        rules.append(field_style("Vitamin B12 (pg/mL)", status))
-
-    if folate is not None:
-        rules.append(field_style("Folate (ng/mL)", "abnormal" if folate < 4 else "normal"))
-
-    if tsh is not None:
-        rules.append(field_style("TSH (μIU/mL)", "abnormal" if tsh > 5 or tsh < 0.4 else "normal"))
-
-    if egfr is not None:
-        status = "abnormal" if egfr < 60 else "borderline" if egfr < 90 else "normal"
-        rules.append(field_style("eGFR (mL/min/1.73m²)", status))
+    values = {"ferritin": ferritin, "tsat": tsat, "b12": b12, "folate": folate, "tsh": tsh, "egfr": egfr}
+    for field, value in values.items():
+        if value is not None:
+            label, classify = LAB_STATUS_RULES[field]
+            rules.append(field_style(label, classify(value)))
 
     if rules:
         st.markdown("<style>" + "".join(rules) + "</style>", unsafe_allow_html=True)
 
 
-def build_known(inputs: dict[str, Any]) -> dict[str, bool]:
-    known = {
-        "ferritin": inputs["ferritin"] is not None,
-        "tsat": inputs["tsat"] is not None,
-        "b12": inputs["b12"] is not None,
-        "folate": inputs["folate"] is not None,
-        "tsh": inputs["tsh"] is not None,
-        "egfr": inputs["egfr"] is not None,
-        "ldh": known_choice(inputs["ldh"]),
-        "haptoglobin": known_choice(inputs["haptoglobin"]),
-        "indirect_bili": known_choice(inputs["indirect_bili"]),
-        "retic_pct": inputs["retic_pct"] is not None,
-        "retic_qual": known_choice(inputs["retic_qual"]),
-        "rpi": inputs["rpi"] is not None,
-        "smear": known_choice(inputs["smear_abnormal"]),
-    }
-    known["iron_complete"] = known["ferritin"] and known["tsat"]
-    known["vits_complete"] = known["b12"] and known["folate"]
-    known["hemo_complete"] = known["ldh"] and known["haptoglobin"] and known["indirect_bili"]
-    known["retic_any"] = known["retic_pct"] or known["retic_qual"] or known["rpi"]
-    return known
-
-
-def interpret_iron_pattern(ferritin: float | None, tsat: float | None) -> dict[str, str] | None:
-    if ferritin is None and tsat is None:
-        return None
-    if ferritin is not None and ferritin < 30:
-        if tsat is not None and tsat < 20:
-            return {
-                "title": "Absolute iron deficiency pattern",
-                "description": "Low ferritin with low transferrin saturation strongly supports depleted iron stores.",
-            }
-        return {
-            "title": "Iron deficiency pattern",
-            "description": "Ferritin below 30 ng/mL supports depleted iron stores, even when MCV is normal.",
-        }
-    if ferritin is not None and ferritin >= 100 and tsat is not None and tsat < 20:
-        return {
-            "title": "Functional iron deficiency pattern",
-            "description": "Low transferrin saturation with preserved or elevated ferritin may occur with inflammation or chronic disease.",
-        }
-    if ferritin is not None and 30 <= ferritin < 100 and tsat is not None and tsat < 20:
-        return {
-            "title": "Possible iron deficiency or mixed inflammatory pattern",
-            "description": "Borderline ferritin with low transferrin saturation may represent iron deficiency, inflammation, or both.",
-        }
-    if ferritin is not None and ferritin >= 100 and tsat is not None and tsat >= 20:
-        return {
-            "title": "Iron deficiency not supported by entered studies",
-            "description": "The entered ferritin and transferrin saturation do not show a typical iron-deficiency pattern.",
-        }
-    return {
-        "title": "Incomplete iron-study pattern",
-        "description": "Enter both ferritin and transferrin saturation for a more specific interpretation.",
-    }
-
-
-def next_most_informative(
-    mcv_cat: str | None,
-    marrow_response: str,
-    known: dict[str, bool],
-    smear_abnormal: str | None,
-) -> list[str]:
-    if mcv_cat == "Microcytic (<80)":
-        return ["Complete iron studies with ferritin and TSAT"] if not known["iron_complete"] else ["Assess bleeding source risk as clinically appropriate"]
-    if mcv_cat == "Normocytic (80–100)":
-        if not known["retic_any"]:
-            return ["Reticulocyte count or RPI"]
-        if marrow_response in ("Appropriate response", "Appropriate/high reticulocyte response"):
-            missing: list[str] = []
-            if not known["hemo_complete"]:
-                missing.append("Complete hemolysis markers")
-            if not known["smear"]:
-                missing.append("Peripheral smear review")
-            return missing or ["Differentiate blood loss from hemolysis"]
-        return ["Evaluate iron status, kidney function, inflammation, and marrow suppression"]
-    if mcv_cat == "Macrocytic (>100)":
-        if not known["vits_complete"]:
-            return ["Vitamin B12 and folate"]
-        if not known["tsh"]:
-            return ["TSH"]
-        if smear_abnormal is None:
-            return ["Peripheral smear result"]
-        return ["Review medications, alcohol exposure, liver disease, and marrow causes"]
-    return ["Select an MCV category"]
-
-
-def progressive_tree_dot(
-    mcv_cat: str | None,
-    marrow_response: str,
-    known: dict[str, bool],
-    iron_pattern: dict[str, str] | None,
-) -> str:
-    nodes = [("Start", "Start")]
-    if mcv_cat is None:
-        nodes.append(("MCV", "Select MCV"))
-    else:
-        nodes.append(("MCV", mcv_cat))
-        if mcv_cat == "Microcytic (<80)":
-            nodes.append(("Path", "Microcytic pathway"))
-            nodes.append(("Current", "Complete iron studies" if not known["iron_complete"] else iron_pattern["title"] if iron_pattern else "Assess iron pattern"))
-        elif mcv_cat == "Normocytic (80–100)":
-            nodes.append(("Path", "Normocytic pathway"))
-            if not known["retic_any"]:
-                nodes.append(("Current", "Obtain reticulocyte response"))
-            else:
-                nodes.append(("Retic", marrow_response))
-                if marrow_response in ("Appropriate response", "Appropriate/high reticulocyte response"):
-                    nodes.append(("Current", "Complete hemolysis evaluation" if not known["hemo_complete"] else "Blood loss vs hemolysis"))
-                else:
-                    nodes.append(("Current", "Underproduction evaluation"))
-        elif mcv_cat == "Macrocytic (>100)":
-            nodes.append(("Path", "Macrocytic pathway"))
-            if not known["vits_complete"]:
-                nodes.append(("Current", "Check B12 and folate"))
-            elif not known["tsh"]:
-                nodes.append(("Current", "Check TSH"))
-            else:
-                nodes.append(("Current", "Review liver, medications, alcohol, and marrow causes"))
-
-    dot = [
-        "digraph G {",
-        "rankdir=TB;",
-        "splines=polyline;",
-        "nodesep=0.35;",
-        "ranksep=0.45;",
-        'graph [bgcolor="transparent", margin=0.05];',
-        'node [shape=box, style="rounded,filled", fontname="Helvetica", fontsize=12, color="#15803d", fontcolor="#111827", fillcolor="#ecfdf5", penwidth=1.4, margin="0.18,0.13"];',
-        'edge [color="#94a3b8", penwidth=1.5, arrowsize=0.8];',
-    ]
-    for node_id, label in nodes:
-        escaped = label.replace('"', "'").replace("\n", "\\n")
-        dot.append(f'{node_id} [label="{escaped}"];')
-    for index in range(len(nodes) - 1):
-        dot.append(f"{nodes[index][0]} -> {nodes[index + 1][0]};")
-    dot.append("}")
-    return "\n".join(dot)
-
-
-def filter_suggestions(lines: list[str], known: dict[str, bool]) -> list[str]:
-    filtered: list[str] = []
-    for line in lines:
-        lower = line.lower()
-        if "peripheral smear" in lower and known["smear"]:
-            continue
-        if ("reticulocyte" in lower or "rpi" in lower) and known["retic_any"]:
-            continue
-        if ("ferritin" in lower or "tsat" in lower or "iron studies" in lower) and known["iron_complete"]:
-            continue
-        if ("b12" in lower or "folate" in lower) and known["vits_complete"]:
-            continue
-        if "tsh" in lower and known["tsh"]:
-            continue
-        if ("egfr" in lower or "creatinine" in lower) and known["egfr"]:
-            continue
-        if ("hemolysis markers" in lower or "ldh" in lower or "haptoglobin" in lower or "indirect bilirubin" in lower) and known["hemo_complete"]:
-            continue
-        filtered.append(line)
-    return dedupe_lines(filtered)
+def render_footer() -> None:
+    st.markdown("---")
+    st.caption("AnemiaDx • Created by Manal Ahmidouch • GMA Clinic / Medical Education • Educational use only")
 
 
 # ============================================================
@@ -555,24 +308,23 @@ def reset_app() -> None:
         "show_all_details": False,
 
         # Symptoms and severity
-        "symptomatic_any": "Select...",
-        "high_risk_symptoms": "Select...",
-        "active_bleeding": "Select...",
-        "cvd": "Select...",
+        "symptomatic_any": SELECT_PLACEHOLDER,
+        "high_risk_symptoms": SELECT_PLACEHOLDER,
+        "active_bleeding": SELECT_PLACEHOLDER,
+        "cvd": SELECT_PLACEHOLDER,
 
         # CBC
         "hb": "",
         "hct": "",
-        "sex": "Select...",
-        "mcv_cat": "Select...",
-        "rdw": "Select...",
-        "other_cytopenias": "Select...",
-        "rapid_onset": "Select...",
-        "smear_abnormal": "Select...",
+        "sex": SELECT_PLACEHOLDER,
+        "mcv_cat": SELECT_PLACEHOLDER,
+        "rdw": SELECT_PLACEHOLDER,
+        "other_cytopenias": SELECT_PLACEHOLDER,
+        "rapid_onset": SELECT_PLACEHOLDER,
+        "smear_abnormal": SELECT_PLACEHOLDER,
 
         # Reticulocytes
-        "retic_mode": "Qualitative",
-        "retic_qual": "Select...",
+        "retic_qual": SELECT_PLACEHOLDER,
         "retic_pct": "",
         "expected_hct": "",
 
@@ -585,9 +337,9 @@ def reset_app() -> None:
         "folate": "",
 
         # Hemolysis markers
-        "ldh": "Select...",
-        "haptoglobin": "Select...",
-        "indirect_bili": "Select...",
+        "ldh": SELECT_PLACEHOLDER,
+        "haptoglobin": SELECT_PLACEHOLDER,
+        "indirect_bili": SELECT_PLACEHOLDER,
 
         # Other contributors
         "tsh": "",
@@ -595,6 +347,9 @@ def reset_app() -> None:
 
         # Exposures
         "exposures": [],
+
+        # Evaluation state
+        "evaluated": False,
     }
 
     for key, default_value in defaults.items():
@@ -632,131 +387,145 @@ with reset_col:
 # ============================================================
 # INPUTS
 # ============================================================
+# (session_state key, label) for the Yes/No/Unknown questions, in display order.
+SYMPTOM_QUESTIONS = (
+    ("symptomatic_any", "Is the patient symptomatic from anemia?"),
+    ("high_risk_symptoms", "Any high-risk symptoms/signs?"),
+    ("active_bleeding", "Concern for active/ongoing bleeding?"),
+    ("cvd", "Significant cardiovascular disease (CAD/HF) present?"),
+)
+CBC_CONTEXT_QUESTIONS = (
+    ("other_cytopenias", "Other cytopenias?"),
+    ("rapid_onset", "Rapid onset or acute Hb drop?"),
+    ("smear_abnormal", "Peripheral smear abnormal?"),
+)
+
 toggle_col_1, toggle_col_2 = st.columns([2, 1])
 with toggle_col_1:
     teaching_mode = st.toggle("Teaching Mode (live tree + reasoning)", value=False, key="teaching_mode")
 with toggle_col_2:
     show_all_details = st.toggle("Expand diagnosis details", value=False, key="show_all_details") if teaching_mode else False
 
-st.header("Symptoms & severity")
-left, right = st.columns(2)
-with left:
-    symptomatic_any = selected(st.selectbox("Is the patient symptomatic from anemia?", ["Select...", "Yes", "No", "Unknown"], key="symptomatic_any"))
-    high_risk_symptoms = selected(st.selectbox("Any high-risk symptoms/signs?", ["Select...", "Yes", "No", "Unknown"], key="high_risk_symptoms"))
-with right:
-    active_bleeding = selected(st.selectbox("Concern for active/ongoing bleeding?", ["Select...", "Yes", "No", "Unknown"], key="active_bleeding"))
-    cvd = selected(st.selectbox("Significant cardiovascular disease (CAD/HF) present?", ["Select...", "Yes", "No", "Unknown"], key="cvd"))
-
-st.header("CBC basics")
-left, right = st.columns(2)
-with left:
-    hb = to_float(st.text_input("Hemoglobin (g/dL)", placeholder="leave blank if unknown", key="hb"))
-    hct = to_float(st.text_input("Hematocrit (%)", placeholder="leave blank if unknown", key="hct"))
-with right:
-    sex = selected(st.selectbox("Sex", ["Select...", "Female", "Male"], key="sex"))
-    mcv_cat = selected(st.selectbox("MCV category", ["Select...", "Microcytic (<80)", "Normocytic (80–100)", "Macrocytic (>100)"], key="mcv_cat"))
-    rdw = selected(st.selectbox("RDW", ["Select...", "Normal", "High", "Unknown"], key="rdw"))
-
-other_cytopenias = None
-rapid_onset = None
-smear_abnormal = None
-with st.expander("CBC context (optional)", expanded=False):
-    c1, c2, c3 = st.columns(3)
-    with c1:
-        other_cytopenias = selected(st.selectbox("Other cytopenias?", ["Select...", "Yes", "No", "Unknown"], key="other_cytopenias"))
-    with c2:
-        rapid_onset = selected(st.selectbox("Rapid onset or acute Hb drop?", ["Select...", "Yes", "No", "Unknown"], key="rapid_onset"))
-    with c3:
-        smear_abnormal = selected(st.selectbox("Peripheral smear abnormal?", ["Select...", "Yes", "No", "Unknown"], key="smear_abnormal"))
-
-st.subheader("Reticulocytes")
-retic_qual = None
-retic_pct = None
-rpi = None
-corrected_retic = None
-mf = None
-with st.expander("Reticulocyte count / RPI", expanded=(mcv_cat == "Normocytic (80–100)")):
-    retic_mode = st.radio("Reticulocyte input", ["Qualitative", "Numeric (%)"], horizontal=True, key="retic_mode")
-    if retic_mode == "Qualitative":
-        retic_qual = selected(st.selectbox("Reticulocyte count", ["Select...", "Low", "Normal", "High"], key="retic_qual"))
-    else:
-        retic_pct = to_float(st.text_input("Reticulocyte %", placeholder="leave blank if unknown", key="retic_pct"))
-    expected_hct_input = to_float(st.text_input("Expected Hematocrit (%)", placeholder="40", key="expected_hct"))
-    expected_hct = expected_hct_input if expected_hct_input is not None else 40.0
-    mf = maturation_factor(hct)
-    if retic_pct is not None and hct is not None and expected_hct > 0:
-        corrected_retic = retic_pct * (hct / expected_hct)
-        if mf:
-            rpi = corrected_retic / mf
-    m1, m2, m3 = st.columns(3)
-    with m1:
-        st.metric("Corrected retic", fmt(corrected_retic, 2, "%"))
-    with m2:
-        st.metric("Maturation factor", fmt(mf, 1))
-    with m3:
-        st.metric("RPI", fmt(rpi, 2))
-
-marrow_response = "Unknown"
-if rpi is not None:
-    marrow_response = "Appropriate response" if rpi >= 2 else "Inadequate response"
-elif retic_qual == "High":
-    marrow_response = "Appropriate/high reticulocyte response"
-elif retic_qual == "Low":
-    marrow_response = "Inadequate/low reticulocyte response"
-
-st.header("Key labs")
-with st.expander("Iron studies", expanded=(mcv_cat == "Microcytic (<80)")):
-    c1, c2 = st.columns(2)
-    with c1:
-        ferritin = to_float(st.text_input("Ferritin (ng/mL)", placeholder="leave blank if unknown", key="ferritin"))
-    with c2:
-        tsat = to_float(st.text_input("Transferrin Saturation (%)", placeholder="leave blank if unknown", key="tsat"))
-
-with st.expander("Vitamin B12 / folate", expanded=(mcv_cat == "Macrocytic (>100)")):
-    c1, c2 = st.columns(2)
-    with c1:
-        b12 = to_float(st.text_input("Vitamin B12 (pg/mL)", placeholder="leave blank if unknown", key="b12"))
-    with c2:
-        folate = to_float(st.text_input("Folate (ng/mL)", placeholder="leave blank if unknown", key="folate"))
-
-with st.expander("Hemolysis markers", expanded=marrow_response in ("Appropriate response", "Appropriate/high reticulocyte response")):
-    c1, c2, c3 = st.columns(3)
-    with c1:
-        ldh = selected(st.selectbox("LDH", ["Select...", "Normal", "High", "Unknown"], key="ldh"))
-    with c2:
-        haptoglobin = selected(st.selectbox("Haptoglobin", ["Select...", "Normal", "Low", "Unknown"], key="haptoglobin"))
-    with c3:
-        indirect_bili = selected(st.selectbox("Indirect bilirubin", ["Select...", "Normal", "High", "Unknown"], key="indirect_bili"))
-
-with st.expander("Other contributors", expanded=mcv_cat in ("Normocytic (80–100)", "Macrocytic (>100)")):
-    c1, c2 = st.columns(2)
-    with c1:
-        tsh = to_float(st.text_input("TSH (μIU/mL)", placeholder="leave blank if unknown", key="tsh"))
-    with c2:
-        egfr = to_float(st.text_input("eGFR (mL/min/1.73m²)", placeholder="leave blank if unknown", key="egfr"))
-
-with st.expander("High-yield medications and exposures", expanded=False):
-    exposures = st.multiselect(
-        "Select any that apply",
-        [
-            "NSAIDs / aspirin (chronic)",
-            "Anticoagulant/antiplatelet use",
-            "PPI (long-term)",
-            "Metformin (long-term)",
-            "Alcohol use (heavy)",
-            "Chemotherapy / antimetabolites",
-            "Hydroxyurea",
-            "Folate-antagonist medication",
-            "Linezolid",
-            "Valproate",
-            "Marrow-toxic antiviral",
-            "Recent transfusion (last 3 months)",
-        ],
-        key="exposures",
-    )
+with st.form("workup"):
+    st.header("Symptoms & severity")
+    answers: dict[str, str | None] = {}
+    for column, questions in zip(st.columns(2), (SYMPTOM_QUESTIONS[:2], SYMPTOM_QUESTIONS[2:])):
+        with column:
+            for key, label in questions:
+                answers[key] = yn_select(label, key)
+
+    st.header("CBC basics")
+    left, right = st.columns(2)
+    with left:
+        hb = to_float(st.text_input("Hemoglobin (g/dL)", placeholder="leave blank if unknown", key="hb"))
+        hct = to_float(st.text_input("Hematocrit (%)", placeholder="leave blank if unknown", key="hct"))
+    with right:
+        sex = selected(st.selectbox("Sex", SEX_OPTIONS, key="sex"))
+        mcv_cat = selected(st.selectbox("MCV category", MCV_OPTIONS, key="mcv_cat"))
+        rdw = selected(st.selectbox("RDW", NORMAL_HIGH_UNKNOWN_OPTIONS, key="rdw"))
+
+    with st.expander("CBC context (optional)", expanded=False):
+        for column, (key, label) in zip(st.columns(3), CBC_CONTEXT_QUESTIONS):
+            with column:
+                answers[key] = yn_select(label, key)
+    symptomatic_any = answers["symptomatic_any"]
+    high_risk_symptoms = answers["high_risk_symptoms"]
+    other_cytopenias = answers["other_cytopenias"]
+    smear_abnormal = answers["smear_abnormal"]
+
+    st.subheader("Reticulocytes")
+    rpi = None
+    corrected_retic = None
+    mf = None
+    with st.expander("Reticulocyte count / RPI", expanded=(mcv_cat == "Normocytic (80–100)")):
+        # Both inputs live in the form so only submitted values drive the summary;
+        # an entered percentage takes precedence over the qualitative count.
+        c1, c2 = st.columns(2)
+        with c1:
+            retic_pct = to_float(st.text_input("Reticulocyte %", placeholder="leave blank if unknown", key="retic_pct"))
+        with c2:
+            retic_qual = selected(st.selectbox("Reticulocyte count", RETIC_QUAL_OPTIONS, key="retic_qual", help="Ignored when Reticulocyte % is entered."))
+        if retic_pct is not None:
+            retic_qual = None
+        expected_hct_input = to_float(st.text_input("Expected Hematocrit (%)", placeholder="40", key="expected_hct"))
+        expected_hct = expected_hct_input if expected_hct_input is not None else 40.0
+        corrected_retic, mf, rpi = reticulocyte_indices(retic_pct, hct, expected_hct)
+        m1, m2, m3 = st.columns(3)
+        with m1:
+            st.metric("Corrected retic", fmt(corrected_retic, 2, "%"))
+        with m2:
+            st.metric("Maturation factor", fmt(mf, 1))
+        with m3:
+            st.metric("RPI", fmt(rpi, 2))
+
+    marrow_response = "Unknown"
+    if rpi is not None:
+        marrow_response = "Appropriate response" if rpi >= 2 else "Inadequate response"
+    elif retic_qual == "High":
+        marrow_response = "Appropriate/high reticulocyte response"
+    elif retic_qual == "Low":
+        marrow_response = "Inadequate/low reticulocyte response"
+
+    st.header("Key labs")
+    with st.expander("Iron studies", expanded=(mcv_cat == "Microcytic (<80)")):
+        c1, c2 = st.columns(2)
+        with c1:
+            ferritin = to_float(st.text_input("Ferritin (ng/mL)", placeholder="leave blank if unknown", key="ferritin"))
+        with c2:
+            tsat = to_float(st.text_input("Transferrin Saturation (%)", placeholder="leave blank if unknown", key="tsat"))
+
+    with st.expander("Vitamin B12 / folate", expanded=(mcv_cat == "Macrocytic (>100)")):
+        c1, c2 = st.columns(2)
+        with c1:
+            b12 = to_float(st.text_input("Vitamin B12 (pg/mL)", placeholder="leave blank if unknown", key="b12"))
+        with c2:
+            folate = to_float(st.text_input("Folate (ng/mL)", placeholder="leave blank if unknown", key="folate"))
+
+    with st.expander("Hemolysis markers", expanded=marrow_response in APPROPRIATE_RESPONSES):
+        c1, c2, c3 = st.columns(3)
+        with c1:
+            ldh = selected(st.selectbox("LDH", NORMAL_HIGH_UNKNOWN_OPTIONS, key="ldh"))
+        with c2:
+            haptoglobin = selected(st.selectbox("Haptoglobin", NORMAL_LOW_UNKNOWN_OPTIONS, key="haptoglobin"))
+        with c3:
+            indirect_bili = selected(st.selectbox("Indirect bilirubin", NORMAL_HIGH_UNKNOWN_OPTIONS, key="indirect_bili"))
+
+    with st.expander("Other contributors", expanded=mcv_cat in ("Normocytic (80–100)", "Macrocytic (>100)")):
+        c1, c2 = st.columns(2)
+        with c1:
+            tsh = to_float(st.text_input("TSH (μIU/mL)", placeholder="leave blank if unknown", key="tsh"))
+        with c2:
+            egfr = to_float(st.text_input("eGFR (mL/min/1.73m²)", placeholder="leave blank if unknown", key="egfr"))
+
+    with st.expander("High-yield medications and exposures", expanded=False):
+        exposures = st.multiselect("Select any that apply", EXPOSURE_OPTIONS, key="exposures")
+
+    submitted = st.form_submit_button("Evaluate", type="primary", use_container_width=True)
+
+if submitted:
+    st.session_state["evaluated"] = True
+evaluated = st.session_state.get("evaluated", False)
 
 inject_input_highlights(hb, sex, ferritin, tsat, b12, folate, tsh, egfr)
 
+
+# ============================================================
+# CLINICAL SUMMARY
+# ============================================================
+st.markdown("---")
+st.header("Clinical summary")
+
+# Nothing below applies until the form is evaluated with an MCV category, so
+# end the rerun here instead of building inputs, the tree, and the differential.
+if not evaluated:
+    st.info("Enter the available data and select Evaluate to generate the clinical impression and ranked differential.")
+    render_footer()
+    st.stop()
+if mcv_cat is None:
+    st.info("Select an MCV category to generate the clinical impression and ranked differential.")
+    render_footer()
+    st.stop()
+
 inputs = {
     "ferritin": ferritin,
     "tsat": tsat,
@@ -773,6 +542,7 @@ inputs = {
     "smear_abnormal": smear_abnormal,
 }
 known = build_known(inputs)
+entered = entered_groups(known)
 iron_pattern = interpret_iron_pattern(ferritin, tsat)
 
 if teaching_mode:
@@ -784,209 +554,116 @@ if teaching_mode:
             f'<div class="next-card-value">{"<br>".join(safe_text(item) for item in next_items)}</div></div>',
             unsafe_allow_html=True,
         )
-        st.graphviz_chart(progressive_tree_dot(mcv_cat, marrow_response, known, iron_pattern), use_container_width=True)
+        st.graphviz_chart(progressive_tree_dot(mcv_cat, marrow_response, known, iron_pattern["title"] if iron_pattern else None), use_container_width=True)
         st.caption("Only the active clinical pathway is displayed.")
 
+no_anemia = False
+if hb is not None and sex is not None:
+    no_anemia = (sex == "Female" and hb >= 12) or (sex == "Male" and hb >= 13)
+
+if no_anemia:
+    st.success("No anemia is detected using the entered hemoglobin and sex-specific threshold.")
+    render_footer()
+    st.stop()
+
+hemolysis_pattern = (ldh, haptoglobin, indirect_bili) == HEMOLYSIS_TRIAD
+facts = Facts(
+    **inputs,
+    mcv_cat=mcv_cat,
+    marrow_response=marrow_response,
+    other_cytopenias=other_cytopenias,
+    hemolysis_pattern=hemolysis_pattern,
+)
+dx = build_differential(facts)
+
+mixed_findings: list[str] = []
+if mcv_cat == "Normocytic (80–100)" and ferritin is not None and ferritin < 30:
+    mixed_findings.append("Normal MCV does not exclude iron deficiency; this may represent early iron deficiency or a mixed anemia.")
+if rdw == "High" and mcv_cat == "Normocytic (80–100)":
+    mixed_findings.append("High RDW with a normal MCV may reflect competing microcytic and macrocytic processes.")
+if mcv_cat == "Microcytic (<80)" and ((b12 is not None and b12 < 200) or (folate is not None and folate < 4)):
+    mixed_findings.append("Vitamin deficiency with microcytosis suggests a possible mixed anemia in which a microcytic process masks macrocytosis.")
+if not MORPHOLOGY_CONFOUNDING_EXPOSURES.isdisjoint(exposures):
+    mixed_findings.append("Recent transfusion may alter MCV and RDW, reducing the reliability of morphology-based classification.")
+
+morphology = mcv_cat.split(" ")[0].lower()
+physiology = ""
+if marrow_response in APPROPRIATE_RESPONSES:
+    physiology = " with an appropriate marrow response"
+elif marrow_response in INADEQUATE_RESPONSES:
+    physiology = " with an inadequate marrow response"
+
+if dx:
+    top_titles = [item.title for item in dx[:2]]
+    clinical_impression = (
+        f"{morphology.capitalize()} anemia{physiology}; {top_titles[0]} is the leading consideration."
+        if len(top_titles) == 1
+        else f"{morphology.capitalize()} anemia{physiology}; leading considerations are {top_titles[0]} and {top_titles[1]}."
+    )
+else:
+    clinical_impression = f"{morphology.capitalize()} anemia{physiology}; additional laboratory data are needed to identify the leading etiology."
 
-# ============================================================
-# CLINICAL SUMMARY
-# ============================================================
-st.markdown("---")
-st.header("Clinical summary")
+st.markdown('<div class="summary-card"><div class="summary-label">Clinical impression</div>' f'<div class="summary-value">{safe_text(clinical_impression)}</div></div>', unsafe_allow_html=True)
 
-if mcv_cat is None:
-    st.info("Select an MCV category to generate the clinical impression and ranked differential.")
-else:
-    no_anemia = False
-    if hb is not None and sex is not None:
-        no_anemia = (sex == "Female" and hb >= 12) or (sex == "Male" and hb >= 13)
+if iron_pattern is not None:
+    st.markdown('<div class="iron-pattern"><div class="iron-pattern-title">' f'{safe_text(iron_pattern["title"])}</div><div>{safe_text(iron_pattern["description"])}</div></div>', unsafe_allow_html=True)
 
-    if no_anemia:
-        st.success("No anemia is detected using the entered hemoglobin and sex-specific threshold.")
-    else:
-        dx: list[dict[str, Any]] = []
-
-        if mcv_cat == "Microcytic (<80)":
-            if ferritin is not None and ferritin >= 100 and tsat is not None and tsat < 20:
-                add_dx(
-                    dx,
-                    "Anemia of chronic inflammation with functional iron deficiency",
-                    "Low iron availability with preserved or elevated ferritin may reflect inflammation-mediated iron restriction.",
-                    [f"Ferritin {fmt(ferritin, 0)} ng/mL", f"TSAT {fmt(tsat, 0, '%')}", "Microcytosis"],
-                    ["Review chronic inflammatory or infectious conditions", "Consider CRP or ESR when clinically indicated"],
-                    "Supported",
-                    15,
-                )
-            elif not (ferritin is not None and ferritin < 30):
-                evidence = ["Microcytosis"]
-                if ferritin is not None:
-                    evidence.append(f"Ferritin {fmt(ferritin, 0)} ng/mL")
-                add_dx(
-                    dx,
-                    "Thalassemia trait / hemoglobinopathy",
-                    "Microcytosis without clearly depleted iron stores raises consideration of thalassemia trait or another hemoglobinopathy.",
-                    evidence,
-                    ["Review RBC count and RDW", "Hemoglobin electrophoresis", "Peripheral smear review if not already available"],
-                    "Possible",
-                    35,
-                )
-
-        elif mcv_cat == "Normocytic (80–100)":
-            if marrow_response in ("Appropriate response", "Appropriate/high reticulocyte response"):
-                add_dx(dx, "Blood loss", "An appropriate marrow response can occur after acute or ongoing blood loss.", ["Normocytic anemia", marrow_response], ["Assess overt and occult bleeding history", "Evaluate GI or gynecologic sources as appropriate"], "Supported", 20)
-                add_dx(dx, "Hemolysis", "An appropriate reticulocyte response may reflect increased red-cell destruction.", ["Normocytic anemia", marrow_response], ["Complete hemolysis markers", "DAT when immune hemolysis is suspected", "Peripheral smear review if not already available"], "Possible", 25)
-            else:
-                add_dx(dx, "Anemia of chronic inflammation", "A normocytic anemia with an inadequate or unknown marrow response commonly occurs with chronic disease.", ["Normocytic anemia", marrow_response], ["Review chronic inflammatory disease burden", "Complete iron studies", "Consider inflammatory markers when indicated"], "Possible", 30)
-                if egfr is not None and egfr < 60:
-                    add_dx(dx, "Anemia associated with chronic kidney disease", "Reduced kidney function may cause a hypoproliferative normocytic anemia.", [f"eGFR {fmt(egfr, 0)}", "Normocytic anemia"], ["Confirm iron sufficiency", "Review kidney-disease severity and trend"], "Supported", 18)
-                if other_cytopenias == "Yes" or smear_abnormal == "Yes" or marrow_response in ("Inadequate response", "Inadequate/low reticulocyte response"):
-                    evidence = ["Underproduction pattern"]
-                    if other_cytopenias == "Yes":
-                        evidence.append("Additional cytopenias")
-                    if smear_abnormal == "Yes":
-                        evidence.append("Abnormal smear")
-                    add_dx(dx, "Bone marrow process or marrow suppression", "An inadequate marrow response, other cytopenias, or abnormal morphology may indicate marrow pathology or medication-related suppression.", evidence, ["Trend complete blood count", "Review medication and exposure history", "Consider hematology evaluation if unexplained"], "Supported" if other_cytopenias == "Yes" or smear_abnormal == "Yes" else "Possible", 22)
-
-        elif mcv_cat == "Macrocytic (>100)":
-            if (b12 is None or b12 >= 200) and (folate is None or folate >= 4):
-                evidence = ["Macrocytosis"]
-                if b12 is not None:
-                    evidence.append(f"B12 {fmt(b12, 0)} pg/mL")
-                if folate is not None:
-                    evidence.append(f"Folate {fmt(folate, 1)} ng/mL")
-                add_dx(dx, "Non-megaloblastic macrocytosis or marrow disorder", "When B12 and folate are not low, consider alcohol, liver disease, hypothyroidism, medication effects, reticulocytosis, or marrow pathology.", evidence, ["Review medications and alcohol exposure", "Consider liver testing", "Check TSH if not already entered", "Consider hematology evaluation if persistent or unexplained"], "Possible", 30)
-
-        if ferritin is not None and ferritin < 30:
-            evidence = [f"Ferritin {fmt(ferritin, 0)} ng/mL", f"MCV: {mcv_cat.split(' ')[0]}"]
-            if tsat is not None:
-                evidence.append(f"TSAT {fmt(tsat, 0, '%')}")
-            add_dx(dx, "Iron deficiency anemia", "Low ferritin supports depleted iron stores. Iron deficiency may remain normocytic early or when mixed with another process.", evidence, ["Assess GI and menstrual blood loss as appropriate", "Consider malabsorption or celiac disease when indicated", "Treat iron deficiency and monitor hematologic response"], "Strongly supported" if tsat is not None and tsat < 20 else "Supported", 5)
-
-        if b12 is not None and b12 < 200:
-            add_dx(dx, "Vitamin B12 deficiency", "A low vitamin B12 level supports a megaloblastic process, although MCV may be normal or low in mixed anemia.", [f"B12 {fmt(b12, 0)} pg/mL", f"MCV: {mcv_cat.split(' ')[0]}"], ["Assess dietary and malabsorption risk", "Consider intrinsic-factor antibody testing", "Consider MMA when the result or clinical context is uncertain"], "Strongly supported", 7)
-        elif b12 is not None and 200 <= b12 < 300:
-            add_dx(dx, "Borderline vitamin B12 status", "Borderline vitamin B12 may warrant biochemical confirmation when symptoms or macrocytosis are present.", [f"B12 {fmt(b12, 0)} pg/mL"], ["Consider methylmalonic acid", "Assess dietary and malabsorption risk"], "Possible", 28)
-
-        if folate is not None and folate < 4:
-            add_dx(dx, "Folate deficiency", "A low folate level supports a megaloblastic process.", [f"Folate {fmt(folate, 1)} ng/mL"], ["Assess nutrition and alcohol exposure", "Review folate-antagonist medications"], "Strongly supported", 8)
-
-        hemolysis_pattern = ldh == "High" and haptoglobin == "Low" and indirect_bili == "High"
-        if hemolysis_pattern:
-            add_dx(dx, "Hemolysis", "High LDH, low haptoglobin, and elevated indirect bilirubin form a classic biochemical hemolysis pattern.", ["High LDH", "Low haptoglobin", "High indirect bilirubin"], ["DAT when immune hemolysis is suspected", "Review peripheral smear findings", "Consider G6PD testing when clinically indicated"], "Strongly supported", 4)
-
-        if tsh is not None and tsh > 5:
-            add_dx(dx, "Hypothyroidism-associated anemia", "An elevated TSH may contribute to normocytic or macrocytic anemia.", [f"TSH {fmt(tsh, 2)} μIU/mL"], ["Review free T4", "Address thyroid dysfunction as clinically appropriate"], "Supported", 24)
-
-        if smear_abnormal == "Yes":
-            add_dx(dx, "Abnormal peripheral smear requiring directed evaluation", "The smear is already known to be abnormal. Evaluation should be guided by the specific morphology rather than repeating a generic smear recommendation.", ["Abnormal smear documented"], ["Identify the reported morphology", "Correlate morphology with CBC, reticulocytes, and hemolysis markers", "Consider hematology input for blasts, schistocytes, or dysplasia"], "Supported", 3)
-
-        dx = dedupe_dx(sorted(dx, key=lambda item: item["priority"]))
-
-        mixed_findings: list[str] = []
-        if mcv_cat == "Normocytic (80–100)" and ferritin is not None and ferritin < 30:
-            mixed_findings.append("Normal MCV does not exclude iron deficiency; this may represent early iron deficiency or a mixed anemia.")
-        if rdw == "High" and mcv_cat == "Normocytic (80–100)":
-            mixed_findings.append("High RDW with a normal MCV may reflect competing microcytic and macrocytic processes.")
-        if mcv_cat == "Microcytic (<80)" and ((b12 is not None and b12 < 200) or (folate is not None and folate < 4)):
-            mixed_findings.append("Vitamin deficiency with microcytosis suggests a possible mixed anemia in which a microcytic process masks macrocytosis.")
-        if "Recent transfusion (last 3 months)" in exposures:
-            mixed_findings.append("Recent transfusion may alter MCV and RDW, reducing the reliability of morphology-based classification.")
-
-        morphology = mcv_cat.split(" ")[0].lower()
-        physiology = ""
-        if marrow_response in ("Appropriate response", "Appropriate/high reticulocyte response"):
-            physiology = " with an appropriate marrow response"
-        elif marrow_response in ("Inadequate response", "Inadequate/low reticulocyte response"):
-            physiology = " with an inadequate marrow response"
-
-        if dx:
-            top_titles = [item["title"] for item in dx[:2]]
-            clinical_impression = (
-                f"{morphology.capitalize()} anemia{physiology}; {top_titles[0]} is the leading consideration."
-                if len(top_titles) == 1
-                else f"{morphology.capitalize()} anemia{physiology}; leading considerations are {top_titles[0]} and {top_titles[1]}."
-            )
-        else:
-            clinical_impression = f"{morphology.capitalize()} anemia{physiology}; additional laboratory data are needed to identify the leading etiology."
-
-        st.markdown('<div class="summary-card"><div class="summary-label">Clinical impression</div>' f'<div class="summary-value">{safe_text(clinical_impression)}</div></div>', unsafe_allow_html=True)
-
-        if iron_pattern is not None:
-            st.markdown('<div class="iron-pattern"><div class="iron-pattern-title">' f'{safe_text(iron_pattern["title"])}</div><div>{safe_text(iron_pattern["description"])}</div></div>', unsafe_allow_html=True)
-
-        if mixed_findings:
-            mixed_html = "".join(f"<li>{safe_text(item)}</li>" for item in mixed_findings)
-            st.markdown('<div class="mixed-card"><strong>Mixed or potentially masked anemia pattern</strong>' f'<ul style="margin-top:0.5rem; margin-bottom:0;">{mixed_html}</ul></div>', unsafe_allow_html=True)
-
-        completed_groups = sum([known["iron_complete"], known["retic_any"], known["vits_complete"], known["hemo_complete"], known["tsh"] or known["egfr"]])
-        completeness, color = ("Low", "#dc2626") if completed_groups <= 1 else ("Moderate", "#d97706") if completed_groups <= 3 else ("High", "#16a34a")
-        st.markdown("#### Data completeness")
-        st.markdown(f'<span style="display:inline-block;padding:5px 11px;border-radius:999px;background:{color};color:#fff;font-size:.82rem;font-weight:800;">{completeness}</span>', unsafe_allow_html=True)
-
-        st.markdown("#### Recommended next steps")
-        base_steps = next_most_informative(mcv_cat, marrow_response, known, smear_abnormal)
-        general_steps = ["Peripheral smear review", "Reticulocyte count or RPI", "Complete iron studies with ferritin and TSAT", "Vitamin B12 and folate", "Complete hemolysis markers", "TSH", "eGFR or creatinine"]
-        filtered_steps = filter_suggestions(base_steps + general_steps, known)
-        tests: list[str] = []
-        actions: list[str] = []
-        for step in filtered_steps:
-            if any(term in step.lower() for term in ("assess", "review", "evaluate", "differentiate", "consider", "monitor", "trend")):
-                actions.append(step)
-            else:
-                tests.append(step)
-        c1, c2 = st.columns(2)
-        with c1:
-            st.markdown("**Next tests**")
-            for item in dedupe_lines(tests)[:3]:
-                st.markdown(f"- {item}")
-        with c2:
-            st.markdown("**Next clinical actions**")
-            for item in dedupe_lines(actions)[:3]:
-                st.markdown(f"- {item}")
-
-        st.header("Most likely etiologies")
-        if not dx:
-            st.info("Enter additional data to generate a ranked differential.")
-        else:
-            for index, item in enumerate(dx[:3], start=1):
-                confidence_class = "confidence-strong" if item["confidence"] == "Strongly supported" else "confidence-supported" if item["confidence"] == "Supported" else "confidence-possible"
-                evidence_html = "".join(f'<span class="evidence-chip">{safe_text(evidence)}</span>' for evidence in clean_evidence(item["evidence"]))
-                card_html = (
-                    '<div class="etiology-card">'
-                    '<div style="display:flex;justify-content:space-between;gap:1rem;align-items:flex-start;">'
-                    f'<div class="etiology-title">{index}. {safe_text(item["title"])}</div>'
-                    f'<span class="{confidence_class}">{safe_text(item["confidence"])}</span>'
-                    '</div>'
-                    f'<div style="margin-top:.55rem;">{evidence_html}</div>'
-                    '</div>'
-                )
-                st.markdown(card_html, unsafe_allow_html=True)
-                with st.expander("Why this diagnosis and suggested workup", expanded=show_all_details):
-                    st.markdown(f"**Why it was selected:** {item['rationale']}")
-                    filtered_workup = filter_suggestions(item["workup"], known)
-                    if filtered_workup:
-                        st.markdown("**Suggested next workup:**")
-                        for workup_item in filtered_workup:
-                            st.markdown(f"- {workup_item}")
-                    else:
-                        st.caption("No additional workup is suggested based on the information already entered.")
-
-        st.markdown("---")
-        with st.expander("When to consider Hematology referral", expanded=False):
-            referral_reasons: list[str] = []
-            if hb is not None and hb < 7 and (symptomatic_any in ("Yes", "Unknown") or high_risk_symptoms in ("Yes", "Unknown")):
-                referral_reasons.append("Severe anemia with symptoms or high-risk features.")
-            if other_cytopenias == "Yes":
-                referral_reasons.append("Anemia with another cytopenia or pancytopenia.")
-            if smear_abnormal == "Yes":
-                referral_reasons.append("Abnormal peripheral smear, especially blasts, schistocytes, dysplasia, or other concerning morphology.")
-            if hemolysis_pattern:
-                referral_reasons.append("Biochemical evidence of hemolysis that is severe, unexplained, or associated with abnormal morphology.")
-            if referral_reasons:
-                for reason in dedupe_lines(referral_reasons):
-                    st.markdown(f"- {reason}")
+if mixed_findings:
+    mixed_html = "".join(f"<li>{safe_text(item)}</li>" for item in mixed_findings)
+    st.markdown('<div class="mixed-card"><strong>Mixed or potentially masked anemia pattern</strong>' f'<ul style="margin-top:0.5rem; margin-bottom:0;">{mixed_html}</ul></div>', unsafe_allow_html=True)
+
+completeness, color = data_completeness(known)
+st.markdown("#### Data completeness")
+st.markdown(BADGE_TEMPLATE.format(color=color, label=completeness), unsafe_allow_html=True)
+
+st.markdown("#### Recommended next steps")
+tests, actions = recommended_next_steps(mcv_cat, marrow_response, known, smear_abnormal)
+c1, c2 = st.columns(2)
+with c1:
+    st.markdown("**Next tests**\n\n" + "\n".join(f"- {item}" for item in islice(tests, 3)))
+with c2:
+    st.markdown("**Next clinical actions**\n\n" + "\n".join(f"- {item}" for item in islice(actions, 3)))
+
+st.header("Most likely etiologies")
+if not dx:
+    st.info("Enter additional data to generate a ranked differential.")
+else:
+    for index, item in enumerate(islice(dx, 3), start=1):
+        confidence_class = CONFIDENCE_CLASSES.get(item.confidence, "confidence-possible")
+        evidence_html = "".join(f'<span class="evidence-chip">{safe_text(evidence)}</span>' for evidence in clean_evidence(item.evidence))
+        card_html = (
+            '<div class="etiology-card">'
+            '<div style="display:flex;justify-content:space-between;gap:1rem;align-items:flex-start;">'
+            f'<div class="etiology-title">{index}. {safe_text(item.title)}</div>'
+            f'<span class="{confidence_class}">{safe_text(item.confidence)}</span>'
+            '</div>'
+            f'<div style="margin-top:.55rem;">{evidence_html}</div>'
+            '</div>'
+        )
+        st.markdown(card_html, unsafe_allow_html=True)
+        with st.expander("Why this diagnosis and suggested workup", expanded=show_all_details):
+            why = f"**Why it was selected:** {item.rationale}"
+            filtered_workup = filter_suggestions(item.workup, entered)
+            if filtered_workup:
+                workup_md = "\n".join(f"- {workup_item}" for workup_item in filtered_workup)
+                st.markdown(f"{why}\n\n**Suggested next workup:**\n\n{workup_md}")
             else:
-                st.caption("No specific referral trigger was identified from the entered data. Clinical judgment still applies.")
+                st.markdown(why)
+                st.caption("No additional workup is suggested based on the information already entered.")
 
 st.markdown("---")
-st.caption("AnemiaDx • Created by Manal Ahmidouch • GMA Clinic / Medical Education • Educational use only")
+with st.expander("When to consider Hematology referral", expanded=False):
+    referral_facts = ReferralFacts(
+        hb=hb,
+        symptom_gate=not YES_OR_UNKNOWN.isdisjoint((symptomatic_any, high_risk_symptoms)),
+        other_cytopenias=other_cytopenias,
+        smear_abnormal=smear_abnormal,
+        hemolysis_pattern=hemolysis_pattern,
+    )
+    referral_reasons = build_referral_reasons(referral_facts)
+    if referral_reasons:
+        st.markdown("\n".join(f"- {reason}" for reason in referral_reasons))
+    else:
+        st.caption("No specific referral trigger was identified from the entered data. Clinical judgment still applies.")
+
+render_footer()
@@ -0,0 +1,722 @@
+"""Pure clinical logic for the AnemiaDx Streamlit app.
+
+Streamlit re-executes anemia_app.py on every interaction, but imported modules
+load once per process, so rule tables and lru_cache'd helpers live here. The
+module does not import Streamlit.
+"""
+import html
+import math
+from bisect import bisect_right
+from dataclasses import dataclass
+from functools import lru_cache
+from operator import attrgetter
+from typing import Any, Callable, NamedTuple
+
+
+# ============================================================
+# HELPERS
+# ============================================================
+SELECT_PLACEHOLDER = "Select..."
+# Values a select can hold before a real answer is chosen ("Select…" from older sessions).
+UNSELECTED_VALUES = frozenset({None, "", SELECT_PLACEHOLDER, "Select…"})
+YES_NO_UNKNOWN_OPTIONS = (SELECT_PLACEHOLDER, "Yes", "No", "Unknown")
+# Answers that should still count toward a safety gate.
+YES_OR_UNKNOWN = frozenset({"Yes", "Unknown"})
+SEX_OPTIONS = (SELECT_PLACEHOLDER, "Female", "Male")
+MCV_OPTIONS = (SELECT_PLACEHOLDER, "Microcytic (<80)", "Normocytic (80–100)", "Macrocytic (>100)")
+RETIC_QUAL_OPTIONS = (SELECT_PLACEHOLDER, "Low", "Normal", "High")
+NORMAL_HIGH_UNKNOWN_OPTIONS = (SELECT_PLACEHOLDER, "Normal", "High", "Unknown")
+NORMAL_LOW_UNKNOWN_OPTIONS = (SELECT_PLACEHOLDER, "Normal", "Low", "Unknown")
+
+
+@lru_cache(maxsize=256)
+def to_float(value: str | None) -> float | None:
+    if not value:
+        return None
+    cleaned = value.strip()
+    if not cleaned or not (cleaned[0].isdigit() or cleaned[0] in "+-."):
+        return None
+    try:
+        number = float(cleaned)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def fmt(value: Any, digits: int = 1, suffix: str = "") -> str:
+    if value is None:
+        return "—"
+    if isinstance(value, (int, float)):
+        return "%.*f%s" % (digits, value, suffix)
+    try:
+        return f"{float(value):.{digits}f}{suffix}"
+    except (TypeError, ValueError):
+        return f"{value}{suffix}"
+
+
+def selected(value: str | None) -> str | None:
+    return None if value in UNSELECTED_VALUES else value
+
+
+def known_choice(value: str | None) -> bool:
+    return value not in (None, "Unknown")
+
+
+def safe_text(value: Any) -> str:
+    return html.escape(str(value))
+
+
+def dedupe_lines(lines: list[str]) -> list[str]:
+    return list(dict.fromkeys(cleaned for line in lines if (cleaned := (line or "").strip())))
+
+
+def clean_evidence(values: list[Any]) -> list[str]:
+    """Remove empty or unknown values before rendering support bubbles."""
+    cleaned: list[str] = []
+    for value in values:
+        text = str(value).strip()
+        if not text:
+            continue
+        if "unknown" in text.lower():
+            continue
+        if text in {"None", "—"}:
+            continue
+        cleaned.append(text)
+    return dedupe_lines(cleaned)
+
+
+@dataclass(slots=True)
+class DxItem:
+    """One ranked etiology in the differential."""
+
+    title: str
+    rationale: str
+    evidence: tuple[str, ...]
+    workup: tuple[str, ...]
+    confidence: str = "Possible"
+    priority: int = 50
+
+
+# CSS class for each confidence badge; anything else renders as "Possible".
+CONFIDENCE_CLASSES = {
+    "Strongly supported": "confidence-strong",
+    "Supported": "confidence-supported",
+}
+
+
+def add_dx(
+    items: list[DxItem],
+    title: str,
+    rationale: str,
+    evidence: list[Any] | None = None,
+    workup: tuple[str, ...] = (),
+    confidence: str = "Possible",
+    priority: int = 50,
+) -> None:
+    items.append(DxItem(title, rationale, tuple(clean_evidence(evidence or [])), workup, confidence, priority))
+
+
+def dedupe_dx(items: list[DxItem]) -> list[DxItem]:
+    """Keep the first item for each title, preserving order."""
+    unique: dict[str, DxItem] = {}
+    for item in items:
+        unique.setdefault(item.title, item)
+    return list(unique.values())
+
+
+# Reticulocyte maturation factor: 2.5 below 20% hematocrit, then 2.0, 1.5,
+# and 1.0 from each cut-off upward (a cut-off value takes the higher band).
+HCT_CUTOFFS = (20, 30, 40)
+MATURATION_FACTORS = (2.5, 2.0, 1.5, 1.0)
+
+
+def maturation_factor(hct: float | None) -> float | None:
+    if hct is None:
+        return None
+    return MATURATION_FACTORS[bisect_right(HCT_CUTOFFS, hct)]
+
+
+@lru_cache(maxsize=1024)
+def reticulocyte_indices(retic_pct: float | None, hct: float | None, expected_hct: float) -> tuple[float | None, float | None, float | None]:
+    """Return (corrected retic %, maturation factor, RPI); unknown parts are None."""
+    mf = maturation_factor(hct)
+    if retic_pct is None or hct is None or expected_hct <= 0:
+        return None, mf, None
+    corrected_retic = retic_pct * (hct / expected_hct)
+    return corrected_retic, mf, corrected_retic / mf if mf else None
+
+
+FIELD_PALETTE = {
+    "abnormal": ("#dc2626", "rgba(220, 38, 38, 0.18)"),
+    "borderline": ("#d97706", "rgba(245, 158, 11, 0.18)"),
+    "normal": ("#16a34a", "rgba(34, 197, 94, 0.14)"),
+}
+
+# CSS declarations per highlight status, built once from FIELD_PALETTE.
+FIELD_STATUS_CSS = {
+    status: (
+        f"background: {background} !important;"
+        f"border: 2px solid {border} !important;"
+        f"box-shadow: 0 0 0 1px {border}33 !important;"
+    )
+    for status, (border, background) in FIELD_PALETTE.items()
+}
+
+
+def field_style(label: str, status: str) -> str:
+    declarations = FIELD_STATUS_CSS.get(status)
+    if declarations is None:
+        return ""
+    return f'input[aria-label="{label}"] {{{declarations}}}'
+
+
+# Field name -> (input label, value -> status), looked up by inject_input_highlights().
+LAB_STATUS_RULES: dict[str, tuple[str, Callable[[float], str]]] = {
+    "ferritin": ("Ferritin (ng/mL)", lambda value: "abnormal" if value < 30 else "borderline" if value < 100 else "normal"),
+    "tsat": ("Transferrin Saturation (%)", lambda value: "abnormal" if value < 20 else "normal"),
+    "b12": ("Vitamin B12 (pg/mL)", lambda value: "abnormal" if value < 200 else "borderline" if value < 300 else "normal"),
+    "folate": ("Folate (ng/mL)", lambda value: "abnormal" if value < 4 else "normal"),
+    "tsh": ("TSH (μIU/mL)", lambda value: "abnormal" if value > 5 or value < 0.4 else "normal"),
+    "egfr": ("eGFR (mL/min/1.73m²)", lambda value: "abnormal" if value < 60 else "borderline" if value < 90 else "normal"),
+}
+
+
+@dataclass(frozen=True, slots=True)
+class Known:
+    """Which inputs and lab groups have been entered."""
+
+    ferritin: bool
+    tsat: bool
+    b12: bool
+    folate: bool
+    tsh: bool
+    egfr: bool
+    ldh: bool
+    haptoglobin: bool
+    indirect_bili: bool
+    retic_pct: bool
+    retic_qual: bool
+    rpi: bool
+    smear: bool
+    iron_complete: bool
+    vits_complete: bool
+    hemo_complete: bool
+    retic_any: bool
+
+
+# Known flags that mean "a number was entered" and "a choice other than
+# Unknown was made", respectively.
+NUMERIC_INPUT_KEYS = ("ferritin", "tsat", "b12", "folate", "tsh", "egfr", "retic_pct", "rpi")
+CHOICE_INPUT_KEYS = ("ldh", "haptoglobin", "indirect_bili", "retic_qual")
+
+
+def build_known(inputs: dict[str, Any]) -> Known:
+    flags = {key: inputs[key] is not None for key in NUMERIC_INPUT_KEYS}
+    flags.update({key: known_choice(inputs[key]) for key in CHOICE_INPUT_KEYS})
+    return Known(
+        **flags,
+        smear=known_choice(inputs["smear_abnormal"]),
+        iron_complete=flags["ferritin"] and flags["tsat"],
+        vits_complete=flags["b12"] and flags["folate"],
+        hemo_complete=flags["ldh"] and flags["haptoglobin"] and flags["indirect_bili"],
+        retic_any=flags["retic_pct"] or flags["retic_qual"] or flags["rpi"],
+    )
+
+
+def entered_groups(known: Known) -> frozenset[str]:
+    return frozenset(name for name in Known.__slots__ if getattr(known, name))
+
+
+BADGE_TEMPLATE = '<span style="display:inline-block;padding:5px 11px;border-radius:999px;background:{color};color:#fff;font-size:.82rem;font-weight:800;">{label}</span>'
+
+
+def data_completeness(known: Known) -> tuple[str, str]:
+    """Return the completeness label and badge color for the entered lab groups."""
+    completed_groups = sum([known.iron_complete, known.retic_any, known.vits_complete, known.hemo_complete, known.tsh or known.egfr])
+    if completed_groups <= 1:
+        return "Low", "#dc2626"
+    if completed_groups <= 3:
+        return "Moderate", "#d97706"
+    return "High", "#16a34a"
+
+
+def interpret_iron_pattern(ferritin: float | None, tsat: float | None) -> dict[str, str] | None:
+    if ferritin is None and tsat is None:
+        return None
+    if ferritin is not None and ferritin < 30:
+        if tsat is not None and tsat < 20:
+            return {
+                "title": "Absolute iron deficiency pattern",
+                "description": "Low ferritin with low transferrin saturation strongly supports depleted iron stores.",
+            }
+        return {
+            "title": "Iron deficiency pattern",
+            "description": "Ferritin below 30 ng/mL supports depleted iron stores, even when MCV is normal.",
+        }
+    if ferritin is not None and ferritin >= 100 and tsat is not None and tsat < 20:
+        return {
+            "title": "Functional iron deficiency pattern",
+            "description": "Low transferrin saturation with preserved or elevated ferritin may occur with inflammation or chronic disease.",
+        }
+    if ferritin is not None and 30 <= ferritin < 100 and tsat is not None and tsat < 20:
+        return {
+            "title": "Possible iron deficiency or mixed inflammatory pattern",
+            "description": "Borderline ferritin with low transferrin saturation may represent iron deficiency, inflammation, or both.",
+        }
+    if ferritin is not None and ferritin >= 100 and tsat is not None and tsat >= 20:
+        return {
+            "title": "Iron deficiency not supported by entered studies",
+            "description": "The entered ferritin and transferrin saturation do not show a typical iron-deficiency pattern.",
+        }
+    return {
+        "title": "Incomplete iron-study pattern",
+        "description": "Enter both ferritin and transferrin saturation for a more specific interpretation.",
+    }
+
+
+# (LDH, haptoglobin, indirect bilirubin) results that together indicate hemolysis.
+HEMOLYSIS_TRIAD = ("High", "Low", "High")
+# Marrow-response labels from the numeric RPI and the qualitative retic count.
+APPROPRIATE_RESPONSES = frozenset({"Appropriate response", "Appropriate/high reticulocyte response"})
+INADEQUATE_RESPONSES = frozenset({"Inadequate response", "Inadequate/low reticulocyte response"})
+
+
+def _nmi_microcytic(marrow_response: str, known: Known, smear_abnormal: str | None) -> list[str]:
+    return ["Complete iron studies with ferritin and TSAT"] if not known.iron_complete else ["Assess bleeding source risk as clinically appropriate"]
+
+
+def _nmi_normocytic(marrow_response: str, known: Known, smear_abnormal: str | None) -> list[str]:
+    if not known.retic_any:
+        return ["Reticulocyte count or RPI"]
+    if marrow_response in APPROPRIATE_RESPONSES:
+        missing: list[str] = []
+        if not known.hemo_complete:
+            missing.append("Complete hemolysis markers")
+        if not known.smear:
+            missing.append("Peripheral smear review")
+        return missing or ["Differentiate blood loss from hemolysis"]
+    return ["Evaluate iron status, kidney function, inflammation, and marrow suppression"]
+
+
+def _nmi_macrocytic(marrow_response: str, known: Known, smear_abnormal: str | None) -> list[str]:
+    if not known.vits_complete:
+        return ["Vitamin B12 and folate"]
+    if not known.tsh:
+        return ["TSH"]
+    if smear_abnormal is None:
+        return ["Peripheral smear result"]
+    return ["Review medications, alcohol exposure, liver disease, and marrow causes"]
+
+
+NMI_HANDLERS = {
+    "Microcytic (<80)": _nmi_microcytic,
+    "Normocytic (80–100)": _nmi_normocytic,
+    "Macrocytic (>100)": _nmi_macrocytic,
+}
+
+
+@lru_cache(maxsize=64)
+def next_most_informative(
+    mcv_cat: str,
+    marrow_response: str,
+    known: Known,
+    smear_abnormal: str | None,
+) -> tuple[str, ...]:
+    return tuple(NMI_HANDLERS[mcv_cat](marrow_response, known, smear_abnormal))
+
+
+DOT_LABEL_ESCAPES = str.maketrans({'"': "'", "\n": "\\n"})
+
+DOT_TEMPLATE = """digraph G {{
+rankdir=TB;
+splines=polyline;
+nodesep=0.35;
+ranksep=0.45;
+graph [bgcolor="transparent", margin=0.05];
+node [shape=box, style="rounded,filled", fontname="Helvetica", fontsize=12, color="#15803d", fontcolor="#111827", fillcolor="#ecfdf5", penwidth=1.4, margin="0.18,0.13"];
+edge [color="#94a3b8", penwidth=1.5, arrowsize=0.8];
+{nodes}
+{edges}
+}}"""
+
+
+def _tree_microcytic(marrow_response: str, known: Known, iron_title: str | None) -> list[tuple[str, str]]:
+    current = "Complete iron studies" if not known.iron_complete else iron_title or "Assess iron pattern"
+    return [("Path", "Microcytic pathway"), ("Current", current)]
+
+
+def _tree_normocytic(marrow_response: str, known: Known, iron_title: str | None) -> list[tuple[str, str]]:
+    if not known.retic_any:
+        return [("Path", "Normocytic pathway"), ("Current", "Obtain reticulocyte response")]
+    if marrow_response in APPROPRIATE_RESPONSES:
+        current = "Complete hemolysis evaluation" if not known.hemo_complete else "Blood loss vs hemolysis"
+    else:
+        current = "Underproduction evaluation"
+    return [("Path", "Normocytic pathway"), ("Retic", marrow_response), ("Current", current)]
+
+
+def _tree_macrocytic(marrow_response: str, known: Known, iron_title: str | None) -> list[tuple[str, str]]:
+    if not known.vits_complete:
+        current = "Check B12 and folate"
+    elif not known.tsh:
+        current = "Check TSH"
+    else:
+        current = "Review liver, medications, alcohol, and marrow causes"
+    return [("Path", "Macrocytic pathway"), ("Current", current)]
+
+
+TREE_HANDLERS = {
+    "Microcytic (<80)": _tree_microcytic,
+    "Normocytic (80–100)": _tree_normocytic,
+    "Macrocytic (>100)": _tree_macrocytic,
+}
+
+
+@lru_cache(maxsize=128)
+def progressive_tree_dot(
+    mcv_cat: str,
+    marrow_response: str,
+    known: Known,
+    iron_title: str | None,
+) -> str:
+    """Build the DOT source for the active pathway; iron_title is the interpret_iron_pattern() title."""
+    nodes = [("Start", "Start"), ("MCV", mcv_cat), *TREE_HANDLERS[mcv_cat](marrow_response, known, iron_title)]
+
+    node_lines = [f'{node_id} [label="{label.translate(DOT_LABEL_ESCAPES)}"];' for node_id, label in nodes]
+    edge_lines = [f"{source} -> {target};" for (source, _), (target, _) in zip(nodes, nodes[1:])]
+    return DOT_TEMPLATE.format(nodes="\n".join(node_lines), edges="\n".join(edge_lines))
+
+
+# Keys are build_known() flags; a suggestion is dropped when any lab group it
+# mentions has already been entered.
+SUGGESTION_KEYWORDS: dict[str, tuple[str, ...]] = {
+    "smear": ("peripheral smear",),
+    "retic_any": ("reticulocyte", "rpi"),
+    "iron_complete": ("ferritin", "tsat", "iron studies"),
+    "vits_complete": ("b12", "folate"),
+    "tsh": ("tsh",),
+    "egfr": ("egfr", "creatinine"),
+    "hemo_complete": ("hemolysis markers", "ldh", "haptoglobin", "indirect bilirubin"),
+}
+
+# (keyword, flag) pairs checked by is_covered() with plain substring tests,
+# which beat a case-insensitive regex on these short phrases.
+SUGGESTION_CUES = tuple((word, key) for key, words in SUGGESTION_KEYWORDS.items() for word in words)
+
+
+@lru_cache(maxsize=256)
+def is_covered(line: str, entered: frozenset[str]) -> bool:
+    """True when the suggestion mentions a lab group that has already been entered."""
+    lower = line.lower()
+    return any(key in entered and word in lower for word, key in SUGGESTION_CUES)
+
+
+@lru_cache(maxsize=128)
+def filter_suggestions(lines: tuple[str, ...], entered: frozenset[str]) -> tuple[str, ...]:
+    """Drop suggestions for data already entered, deduplicating in the same pass."""
+    filtered: dict[str, None] = {}
+    for line in lines:
+        cleaned = (line or "").strip()
+        if not cleaned or cleaned in filtered or is_covered(cleaned, entered):
+            continue
+        filtered[cleaned] = None
+    return tuple(filtered)
+
+
+# Always offered after the pathway-specific steps, unless already entered.
+GENERAL_NEXT_STEPS = ("Peripheral smear review", "Reticulocyte count or RPI", "Complete iron studies with ferritin and TSAT", "Vitamin B12 and folate", "Complete hemolysis markers", "TSH", "eGFR or creatinine")
+# A step mentioning any of these verbs is a clinical action rather than a test.
+ACTION_TERMS = ("assess", "review", "evaluate", "differentiate", "consider", "monitor", "trend")
+
+
+@lru_cache(maxsize=64)
+def recommended_next_steps(
+    mcv_cat: str,
+    marrow_response: str,
+    known: Known,
+    smear_abnormal: str | None,
+) -> tuple[tuple[str, ...], tuple[str, ...]]:
+    """Split the filtered next steps into (tests, clinical actions)."""
+    base_steps = next_most_informative(mcv_cat, marrow_response, known, smear_abnormal)
+    tests: list[str] = []
+    actions: list[str] = []
+    for step in filter_suggestions((*base_steps, *GENERAL_NEXT_STEPS), entered_groups(known)):
+        lower = step.lower()
+        (actions if any(term in lower for term in ACTION_TERMS) else tests).append(step)
+    return tuple(tests), tuple(actions)
+
+
+# ============================================================
+# DIFFERENTIAL RULES
+# ============================================================
+EXPOSURE_OPTIONS = (
+    "NSAIDs / aspirin (chronic)",
+    "Anticoagulant/antiplatelet use",
+    "PPI (long-term)",
+    "Metformin (long-term)",
+    "Alcohol use (heavy)",
+    "Chemotherapy / antimetabolites",
+    "Hydroxyurea",
+    "Folate-antagonist medication",
+    "Linezolid",
+    "Valproate",
+    "Marrow-toxic antiviral",
+    "Recent transfusion (last 3 months)",
+)
+# Exposures that make MCV/RDW-based classification unreliable.
+MORPHOLOGY_CONFOUNDING_EXPOSURES = frozenset({"Recent transfusion (last 3 months)"})
+
+
+class Facts(NamedTuple):
+    """One patient's inputs as seen by the differential rules."""
+
+    ferritin: float | None
+    tsat: float | None
+    b12: float | None
+    folate: float | None
+    tsh: float | None
+    egfr: float | None
+    ldh: str | None
+    haptoglobin: str | None
+    indirect_bili: str | None
+    retic_pct: float | None
+    retic_qual: str | None
+    rpi: float | None
+    smear_abnormal: str | None
+    mcv_cat: str
+    marrow_response: str
+    other_cytopenias: str | None
+    hemolysis_pattern: bool
+
+
+@dataclass(frozen=True, slots=True)
+class Rule:
+    """One differential rule: fires when `when(facts)` is true."""
+
+    when: Callable[[Facts], bool]
+    title: str
+    rationale: str
+    evidence: Callable[[Facts], list[str]]
+    workup: tuple[str, ...]
+    confidence: str | Callable[[Facts], str]
+    priority: int
+    mcv_cat: str | None = None  # only considered for this MCV category; None means any
+
+
+# Evaluated in order by build_differential(). Rule.evidence and a callable
+# Rule.confidence are computed from the same facts as Rule.when.
+DX_RULES: tuple[Rule, ...] = (
+    Rule(
+        mcv_cat="Microcytic (<80)",
+        when=lambda f: f.ferritin is not None and f.ferritin >= 100 and f.tsat is not None and f.tsat < 20,
+        title="Anemia of chronic inflammation with functional iron deficiency",
+        rationale="Low iron availability with preserved or elevated ferritin may reflect inflammation-mediated iron restriction.",
+        evidence=lambda f: [f"Ferritin {fmt(f.ferritin, 0)} ng/mL", f"TSAT {fmt(f.tsat, 0, '%')}", "Microcytosis"],
+        workup=("Review chronic inflammatory or infectious conditions", "Consider CRP or ESR when clinically indicated"),
+        confidence="Supported",
+        priority=15,
+    ),
+    Rule(
+        mcv_cat="Microcytic (<80)",
+        when=lambda f: (
+            not (f.ferritin is not None and f.ferritin >= 100 and f.tsat is not None and f.tsat < 20)
+            and not (f.ferritin is not None and f.ferritin < 30)
+        ),
+        title="Thalassemia trait / hemoglobinopathy",
+        rationale="Microcytosis without clearly depleted iron stores raises consideration of thalassemia trait or another hemoglobinopathy.",
+        evidence=lambda f: ["Microcytosis"] + ([f"Ferritin {fmt(f.ferritin, 0)} ng/mL"] if f.ferritin is not None else []),
+        workup=("Review RBC count and RDW", "Hemoglobin electrophoresis", "Peripheral smear review if not already available"),
+        confidence="Possible",
+        priority=35,
+    ),
+    Rule(
+        mcv_cat="Normocytic (80–100)",
+        when=lambda f: f.marrow_response in APPROPRIATE_RESPONSES,
+        title="Blood loss",
+        rationale="An appropriate marrow response can occur after acute or ongoing blood loss.",
+        evidence=lambda f: ["Normocytic anemia", f.marrow_response],
+        workup=("Assess overt and occult bleeding history", "Evaluate GI or gynecologic sources as appropriate"),
+        confidence="Supported",
+        priority=20,
+    ),
+    Rule(
+        mcv_cat="Normocytic (80–100)",
+        when=lambda f: f.marrow_response in APPROPRIATE_RESPONSES,
+        title="Hemolysis",
+        rationale="An appropriate reticulocyte response may reflect increased red-cell destruction.",
+        evidence=lambda f: ["Normocytic anemia", f.marrow_response],
+        workup=("Complete hemolysis markers", "DAT when immune hemolysis is suspected", "Peripheral smear review if not already available"),
+        confidence="Possible",
+        priority=25,
+    ),
+    Rule(
+        mcv_cat="Normocytic (80–100)",
+        when=lambda f: f.marrow_response not in APPROPRIATE_RESPONSES,
+        title="Anemia of chronic inflammation",
+        rationale="A normocytic anemia with an inadequate or unknown marrow response commonly occurs with chronic disease.",
+        evidence=lambda f: ["Normocytic anemia", f.marrow_response],
+        workup=("Review chronic inflammatory disease burden", "Complete iron studies", "Consider inflammatory markers when indicated"),
+        confidence="Possible",
+        priority=30,
+    ),
+    Rule(
+        mcv_cat="Normocytic (80–100)",
+        when=lambda f: f.marrow_response not in APPROPRIATE_RESPONSES and f.egfr is not None and f.egfr < 60,
+        title="Anemia associated with chronic kidney disease",
+        rationale="Reduced kidney function may cause a hypoproliferative normocytic anemia.",
+        evidence=lambda f: [f"eGFR {fmt(f.egfr, 0)}", "Normocytic anemia"],
+        workup=("Confirm iron sufficiency", "Review kidney-disease severity and trend"),
+        confidence="Supported",
+        priority=18,
+    ),
+    Rule(
+        mcv_cat="Normocytic (80–100)",
+        when=lambda f: (
+            f.marrow_response not in APPROPRIATE_RESPONSES
+            and (f.other_cytopenias == "Yes" or f.smear_abnormal == "Yes" or f.marrow_response in INADEQUATE_RESPONSES)
+        ),
+        title="Bone marrow process or marrow suppression",
+        rationale="An inadequate marrow response, other cytopenias, or abnormal morphology may indicate marrow pathology or medication-related suppression.",
+        evidence=lambda f: (
+            ["Underproduction pattern"]
+            + (["Additional cytopenias"] if f.other_cytopenias == "Yes" else [])
+            + (["Abnormal smear"] if f.smear_abnormal == "Yes" else [])
+        ),
+        workup=("Trend complete blood count", "Review medication and exposure history", "Consider hematology evaluation if unexplained"),
+        confidence=lambda f: "Supported" if f.other_cytopenias == "Yes" or f.smear_abnormal == "Yes" else "Possible",
+        priority=22,
+    ),
+    Rule(
+        mcv_cat="Macrocytic (>100)",
+        when=lambda f: (f.b12 is None or f.b12 >= 200) and (f.folate is None or f.folate >= 4),
+        title="Non-megaloblastic macrocytosis or marrow disorder",
+        rationale="When B12 and folate are not low, consider alcohol, liver disease, hypothyroidism, medication effects, reticulocytosis, or marrow pathology.",
+        evidence=lambda f: (
+            ["Macrocytosis"]
+            + ([f"B12 {fmt(f.b12, 0)} pg/mL"] if f.b12 is not None else [])
+            + ([f"Folate {fmt(f.folate, 1)} ng/mL"] if f.folate is not None else [])
+        ),
+        workup=("Review medications and alcohol exposure", "Consider liver testing", "Check TSH if not already entered", "Consider hematology evaluation if persistent or unexplained"),
+        confidence="Possible",
+        priority=30,
+    ),
+    Rule(
+        when=lambda f: f.ferritin is not None and f.ferritin < 30,
+        title="Iron deficiency anemia",
+        rationale="Low ferritin supports depleted iron stores. Iron deficiency may remain normocytic early or when mixed with another process.",
+        evidence=lambda f: (
+            [f"Ferritin {fmt(f.ferritin, 0)} ng/mL", f"MCV: {f.mcv_cat.split(' ')[0]}"]
+            + ([f"TSAT {fmt(f.tsat, 0, '%')}"] if f.tsat is not None else [])
+        ),
+        workup=("Assess GI and menstrual blood loss as appropriate", "Consider malabsorption or celiac disease when indicated", "Treat iron deficiency and monitor hematologic response"),
+        confidence=lambda f: "Strongly supported" if f.tsat is not None and f.tsat < 20 else "Supported",
+        priority=5,
+    ),
+    Rule(
+        when=lambda f: f.b12 is not None and f.b12 < 200,
+        title="Vitamin B12 deficiency",
+        rationale="A low vitamin B12 level supports a megaloblastic process, although MCV may be normal or low in mixed anemia.",
+        evidence=lambda f: [f"B12 {fmt(f.b12, 0)} pg/mL", f"MCV: {f.mcv_cat.split(' ')[0]}"],
+        workup=("Assess dietary and malabsorption risk", "Consider intrinsic-factor antibody testing", "Consider MMA when the result or clinical context is uncertain"),
+        confidence="Strongly supported",
+        priority=7,
+    ),
+    Rule(
+        when=lambda f: f.b12 is not None and 200 <= f.b12 < 300,
+        title="Borderline vitamin B12 status",
+        rationale="Borderline vitamin B12 may warrant biochemical confirmation when symptoms or macrocytosis are present.",
+        evidence=lambda f: [f"B12 {fmt(f.b12, 0)} pg/mL"],
+        workup=("Consider methylmalonic acid", "Assess dietary and malabsorption risk"),
+        confidence="Possible",
+        priority=28,
+    ),
+    Rule(
+        when=lambda f: f.folate is not None and f.folate < 4,
+        title="Folate deficiency",
+        rationale="A low folate level supports a megaloblastic process.",
+        evidence=lambda f: [f"Folate {fmt(f.folate, 1)} ng/mL"],
+        workup=("Assess nutrition and alcohol exposure", "Review folate-antagonist medications"),
+        confidence="Strongly supported",
+        priority=8,
+    ),
+    Rule(
+        when=lambda f: f.hemolysis_pattern,
+        title="Hemolysis",
+        rationale="High LDH, low haptoglobin, and elevated indirect bilirubin form a classic biochemical hemolysis pattern.",
+        evidence=lambda f: ["High LDH", "Low haptoglobin", "High indirect bilirubin"],
+        workup=("DAT when immune hemolysis is suspected", "Review peripheral smear findings", "Consider G6PD testing when clinically indicated"),
+        confidence="Strongly supported",
+        priority=4,
+    ),
+    Rule(
+        when=lambda f: f.tsh is not None and f.tsh > 5,
+        title="Hypothyroidism-associated anemia",
+        rationale="An elevated TSH may contribute to normocytic or macrocytic anemia.",
+        evidence=lambda f: [f"TSH {fmt(f.tsh, 2)} μIU/mL"],
+        workup=("Review free T4", "Address thyroid dysfunction as clinically appropriate"),
+        confidence="Supported",
+        priority=24,
+    ),
+    Rule(
+        when=lambda f: f.smear_abnormal == "Yes",
+        title="Abnormal peripheral smear requiring directed evaluation",
+        rationale="The smear is already known to be abnormal. Evaluation should be guided by the specific morphology rather than repeating a generic smear recommendation.",
+        evidence=lambda f: ["Abnormal smear documented"],
+        workup=("Identify the reported morphology", "Correlate morphology with CBC, reticulocytes, and hemolysis markers", "Consider hematology input for blasts, schistocytes, or dysplasia"),
+        confidence="Supported",
+        priority=3,
+    ),
+)
+
+
+# DX_RULES pre-filtered per MCV category, so each evaluation tests mcv_cat
+# once instead of inside every rule predicate.
+RULES_BY_MCV = {
+    category: tuple(rule for rule in DX_RULES if rule.mcv_cat in (None, category))
+    for category in MCV_OPTIONS[1:]
+}
+
+
+@lru_cache(maxsize=64)
+def build_differential(facts: Facts) -> tuple[DxItem, ...]:
+    """Evaluate DX_RULES against one patient's facts and rank the matches."""
+    dx: list[DxItem] = []
+    for rule in RULES_BY_MCV[facts.mcv_cat]:
+        if not rule.when(facts):
+            continue
+        confidence = rule.confidence(facts) if callable(rule.confidence) else rule.confidence
+        add_dx(dx, rule.title, rule.rationale, rule.evidence(facts), rule.workup, confidence, rule.priority)
+    dx.sort(key=attrgetter("priority"))
+    return tuple(dedupe_dx(dx))
+
+
+class ReferralFacts(NamedTuple):
+    """The inputs the Hematology-referral rules look at."""
+
+    hb: float | None
+    symptom_gate: bool
+    other_cytopenias: str | None
+    smear_abnormal: str | None
+    hemolysis_pattern: bool
+
+
+@dataclass(frozen=True, slots=True)
+class ReferralRule:
+    """One Hematology-referral trigger: shows `reason` when `when(facts)` is true."""
+
+    when: Callable[[ReferralFacts], bool]
+    reason: str
+
+
+# Evaluated in display order by build_referral_reasons().
+REFERRAL_RULES: tuple[ReferralRule, ...] = (
+    ReferralRule(lambda f: f.hb is not None and f.hb < 7 and f.symptom_gate, "Severe anemia with symptoms or high-risk features."),
+    ReferralRule(lambda f: f.other_cytopenias == "Yes", "Anemia with another cytopenia or pancytopenia."),
+    ReferralRule(lambda f: f.smear_abnormal == "Yes", "Abnormal peripheral smear, especially blasts, schistocytes, dysplasia, or other concerning morphology."),
+    ReferralRule(lambda f: f.hemolysis_pattern, "Biochemical evidence of hemolysis that is severe, unexplained, or associated with abnormal morphology."),
+)
+
+
+@lru_cache(maxsize=64)
+def build_referral_reasons(facts: ReferralFacts) -> tuple[str, ...]:
+    return tuple(rule.reason for rule in REFERRAL_RULES if rule.when(facts))